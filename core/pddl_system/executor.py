@@ -6,9 +6,27 @@ This module handles script execution, task verification, and adaptive replanning
 It executes VirtualHome scripts and verifies task completion through state comparison.
 """
 
+import os
+import random
+import re
+import sys
 import time
 from requests.exceptions import ReadTimeout, ConnectionError
 
+# Matches "[ACTION] <target>" in a script line such as "<char0> [WALK] <bedroom> (74)"
+_ACTION_RE = re.compile(r'\[(\w+)\]\s+<([^>]+)>')
+
+# Rooms with known navigation/collision issues in VirtualHome
+_PROBLEMATIC_ROOMS = frozenset({'livingroom'})
+
+# Execution failure classification for adaptive replanning, checked in order.
+# Group 1 (when present) captures the problematic object.
+_FAILURE_PATTERNS = (
+    ('unknown_object', re.compile(r'Unknown object\s*([^\n]*?)\s*(?=Unknown object|$)', re.MULTILINE)),
+    ('unreachable_object', re.compile(r'Can not select object(?::([^.]*)\..*REASON:)?', re.DOTALL)),
+    ('navigation_collision', re.compile(r'collision', re.IGNORECASE)),
+)
+
 
 class Executor:
     """
@@ -32,10 +50,16 @@ class Executor:
         self.comm = comm
         self.model = model
 
+        # Frames are saved to core/Output; resolve and create it once
+        self._output_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'Output')
+        os.makedirs(self._output_dir, exist_ok=True)
+
     def _retry_with_backoff(self, func, max_retries=3, initial_wait=2, *args, **kwargs):
         """
         Retry a function with exponential backoff on timeout/connection errors.
 
+        Other exceptions are not retried and propagate on the first attempt.
+
         Args:
             func: Function to retry
             max_retries: Maximum number of retry attempts
@@ -45,21 +69,21 @@ class Executor:
         Returns:
             Result of the function call, or raises the last exception
         """
-        wait_time = initial_wait
         last_exception = None
 
         for attempt in range(max_retries):
             try:
                 return func(*args, **kwargs)
-            except (ReadTimeout, ConnectionError, Exception) as e:
+            except (ReadTimeout, ConnectionError) as e:
                 last_exception = e
                 error_type = type(e).__name__
 
                 if attempt < max_retries - 1:
+                    # Exponential backoff with jitter
+                    wait_time = initial_wait * (2 ** attempt) * (0.5 + random.random())
                     print(f"  ⚠️  {error_type} on attempt {attempt + 1}/{max_retries}")
-                    print(f"  Retrying in {wait_time}s...")
+                    print(f"  Retrying in {wait_time:.1f}s...")
                     time.sleep(wait_time)
-                    wait_time *= 2  # Exponential backoff
                 else:
                     print(f"  ❌ Failed after {max_retries} attempts")
 
@@ -78,9 +102,6 @@ class Executor:
         """
         print("Step 5: Executing script and verifying completion")
 
-        # Spatial validation before execution
-        self._validate_spatial_constraints(vh_script)
-
         # Capture initial state with retry logic
         try:
             success, initial_graph = self._retry_with_backoff(
@@ -95,14 +116,13 @@ class Executor:
             print(f"Error capturing initial state after retries: {e}")
             return False, f"Cannot capture initial state: {str(e)}"
 
+        # Spatial validation before execution (reuses the initial state graph)
+        self._validate_spatial_constraints(vh_script, graph=initial_graph)
+
         # Execute script with recording
         print(f"Executing {len(vh_script)} actions...")
 
-        # Ensure Output directory exists
-        import os
-        output_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'Output')
-        os.makedirs(output_dir, exist_ok=True)
-        print(f"Saving frames to: {output_dir}")
+        print(f"Saving frames to: {self._output_dir}")
 
         execution_success, message = self.comm.render_script(
             vh_script,
@@ -111,7 +131,7 @@ class Executor:
             frame_rate=3,
             camera_mode=["PERSON_FROM_BACK"],
             file_name_prefix=f"pddl_task_{task['id']}",
-            output_folder=output_dir,  # Specify where to save frames
+            output_folder=self._output_dir,  # Specify where to save frames
             processing_time_limit=300,
             skip_execution=False,
             image_synthesis=["normal"],  # Ensure image generation
@@ -160,12 +180,13 @@ class Executor:
 
         return execution_success, verification_result
 
-    def _validate_spatial_constraints(self, vh_script):
+    def _validate_spatial_constraints(self, vh_script, graph=None):
         """
         Pre-execution spatial validation to catch navigation issues.
 
         Args:
             vh_script: List of VirtualHome script commands
+            graph: Current scene graph (optional, fetched from the simulator if not given)
 
         Returns:
             bool: Always True (continues execution with warnings)
@@ -173,25 +194,25 @@ class Executor:
         print("\n=== SPATIAL VALIDATION ===")
 
         # Get current scene state
-        success, graph = self.comm.environment_graph()
-        if not success:
-            print("Could not get scene graph for validation")
-            return True  # Continue anyway
+        if graph is None:
+            success, graph = self.comm.environment_graph()
+            if not success:
+                print("Could not get scene graph for validation")
+                return True  # Continue anyway
 
         # Check if agent can reach target rooms/objects
         issues = []
         for i, action_line in enumerate(vh_script):
-            action_parts = action_line.split()
-            if len(action_parts) >= 2:
-                action = action_parts[1].replace('[', '').replace(']', '')
-
-                if action == 'WALK':
-                    # Extract target room/object
-                    target = action_parts[2].replace('<', '').replace('>', '')
-                    print(f"  Checking walk to: {target}")
-                    # For now, just warn about known problematic navigation
-                    if target.lower() in ['livingroom']:
-                        issues.append(f"Action {i+1}: Navigation to {target} may have collision issues")
+            match = _ACTION_RE.search(action_line)
+            if not match:
+                continue
+            action, target = match.group(1), match.group(2)
+
+            if action == 'WALK':
+                print(f"  Checking walk to: {target}")
+                # For now, just warn about known problematic navigation
+                if target.lower() in _PROBLEMATIC_ROOMS:
+                    issues.append(f"Action {i+1}: Navigation to {target} may have collision issues")
 
         if issues:
             print("Potential spatial issues detected:")
@@ -218,63 +239,108 @@ class Executor:
         task_lower = task['description'].lower()
 
         # Get state changes
-        initial_states = self._extract_object_states(initial_graph)
-        final_states = self._extract_object_states(final_graph)
+        _, initial_states = self._extract_object_states(initial_graph)
+        final_class_index, final_states = self._extract_object_states(final_graph)
 
-        changes = []
-        for obj_id, final_state in final_states.items():
-            initial_state = initial_states.get(obj_id, {})
-            if final_state != initial_state:
-                changes.append(f"Object {obj_id} changed: {initial_state} -> {final_state}")
+        # Dict equality runs in C and covers the common "nothing happened" case
+        if initial_states == final_states:
+            changes = 0
+        else:
+            changes = sum(1 for obj_id, states in final_states.items()
+                          if initial_states.get(obj_id) != states)
 
         # Task-specific verification
-        if 'email' in task_lower or 'computer' in task_lower:
-            # Check if computer is on
-            computer_on = False
-            for obj_id, state in final_states.items():
-                if any(comp in state.get('class_name', '').lower() for comp in ['computer', 'cpuscreen']):
-                    print(f"Computer object {state.get('class_name')}: {state.get('states', [])}")
-                    if 'ON' in state.get('states', []):
-                        computer_on = True
-                        break
-
-            if computer_on:
-                return f"SUCCESS: Computer turned on. Changes: {len(changes)}"
-            else:
-                return f"PARTIAL: Computer not detected as ON. Changes: {len(changes)}"
-
-        elif 'fridge' in task_lower:
-            # Check fridge state
-            for obj_id, state in final_states.items():
-                if 'fridge' in state.get('class_name', '').lower():
-                    if 'CLOSED' in state.get('states', []):
-                        return f"SUCCESS: Fridge properly closed. Changes: {len(changes)}"
-            return f"PARTIAL: Fridge state unclear. Changes: {len(changes)}"
+        for keywords_re, verifier in self._VERIFIERS:
+            if keywords_re.search(task_lower):
+                return verifier(self, final_class_index, final_states, changes)
+
+        # Generic verification
+        if changes > 0:
+            return f"SUCCESS: Environment changed. Changes: {changes}"
+        else:
+            return f"UNCLEAR: No significant changes detected"
+
+    def _verify_computer_on(self, class_index, states, changes):
+        """
+        Check that a computer object is switched on.
+
+        Args:
+            class_index: Mapping of lowercase class names to object IDs
+            states: Mapping of object IDs to state frozensets
+            changes: Number of objects whose state changed
 
+        Returns:
+            str: Verification result message
+        """
+        computer_ids = [(class_name, obj_id)
+                        for class_name, obj_ids in class_index.items()
+                        if 'computer' in class_name or 'cpuscreen' in class_name
+                        for obj_id in obj_ids]
+
+        computer_on = False
+        for class_name, obj_id in computer_ids:
+            print(f"Computer object {class_name}: {sorted(states[obj_id])}")
+            if 'ON' in states[obj_id]:
+                computer_on = True
+                break
+
+        if computer_on:
+            return f"SUCCESS: Computer turned on. Changes: {changes}"
         else:
-            # Generic verification
-            if len(changes) > 0:
-                return f"SUCCESS: Environment changed. Changes: {len(changes)}"
-            else:
-                return f"UNCLEAR: No significant changes detected"
+            return f"PARTIAL: Computer not detected as ON. Changes: {changes}"
+
+    def _verify_fridge_closed(self, class_index, states, changes):
+        """
+        Check that a fridge object is closed.
+
+        Args:
+            class_index: Mapping of lowercase class names to object IDs
+            states: Mapping of object IDs to state frozensets
+            changes: Number of objects whose state changed
+
+        Returns:
+            str: Verification result message
+        """
+        fridge_ids = [obj_id
+                      for class_name, obj_ids in class_index.items()
+                      if 'fridge' in class_name
+                      for obj_id in obj_ids]
+
+        if any('CLOSED' in states[obj_id] for obj_id in fridge_ids):
+            return f"SUCCESS: Fridge properly closed. Changes: {changes}"
+        return f"PARTIAL: Fridge state unclear. Changes: {changes}"
+
+    # Task-description keywords (matched as substrings, so "emails" and
+    # "fridges" count) -> verifier, checked in order
+    _VERIFIERS = (
+        (re.compile(r'email|computer'), _verify_computer_on),
+        (re.compile(r'fridge'), _verify_fridge_closed),
+    )
 
     def _extract_object_states(self, graph):
         """
         Extract object states from scene graph.
 
+        States are keyed by object ID so that state comparison is a frozenset
+        equality check per object. Object IDs are also indexed by lowercase
+        class name (interned, so initial and final graphs share the strings)
+        so verifiers only scan distinct class names.
+
         Args:
             graph: Scene graph dictionary
 
         Returns:
-            dict: Mapping of object IDs to their states
+            tuple: (class_index: dict of lowercase class name -> list of IDs,
+                    states: dict of ID -> frozenset of states)
         """
+        class_index = {}
         states = {}
         for node in graph['nodes']:
-            states[node['id']] = {
-                'class_name': node['class_name'],
-                'states': node.get('states', [])
-            }
-        return states
+            node_id = node['id']
+            class_name = sys.intern(node['class_name'].lower())
+            class_index.setdefault(class_name, []).append(node_id)
+            states[node_id] = frozenset(node.get('states', ()))
+        return class_index, states
 
     def _analyze_failure_and_replan(self, error_message, original_script, task):
         """
@@ -290,26 +356,22 @@ class Executor:
         """
         print("\nADAPTIVE REPLANNING - Analyzing failure...")
 
-        # Analyze the type of failure
+        # Nothing to classify without an error message
+        if not error_message:
+            print("  No alternative strategy available for this failure type")
+            return None
+
+        # Analyze the type of failure (first matching pattern wins)
         failure_type = None
         problematic_object = None
 
-        if "Unknown object" in error_message:
-            failure_type = "unknown_object"
-            # Extract object name from error
-            parts = error_message.split("Unknown object")
-            if len(parts) > 1:
-                problematic_object = parts[1].strip()
-        elif "Can not select object" in error_message:
-            failure_type = "unreachable_object"
-            # Extract object name
-            if "REASON:" in error_message:
-                parts = error_message.split("Can not select object:")
-                if len(parts) > 1:
-                    obj_part = parts[1].split(".")[0].strip()
-                    problematic_object = obj_part
-        elif "collision" in error_message.lower():
-            failure_type = "navigation_collision"
+        for pattern_type, pattern in _FAILURE_PATTERNS:
+            match = pattern.search(error_message)
+            if match:
+                failure_type = pattern_type
+                if match.lastindex:
+                    problematic_object = match.group(1).strip() or None
+                break
 
         print(f"  Failure type: {failure_type}")
         if problematic_object:
@@ -6,32 +6,175 @@ This module uses Google's Gemini LLM to solve PDDL planning problems.
 It takes a PDDL domain and problem as input and generates a valid action plan.
 """
 
+import asyncio
+import hashlib
+import json
 import os
-import signal
-from contextlib import contextmanager
+import heapq
+import re
 import google.generativeai as genai
 from google.api_core import exceptions as google_exceptions
 
 
-class TimeoutError(Exception):
-    """Custom timeout exception"""
-    pass
+# Task-independent part of the planning prompt, sent ahead of the task-specific
+# sections. At roughly 600 tokens it is below Gemini's minimum cacheable prefix,
+# so nothing is reused across requests; the ordering only keeps it in one place.
+_PLANNER_INSTRUCTIONS = """
+You are a PDDL planner for VirtualHome simulator.
 
+VALID PDDL ACTIONS (use EXACT names):
+1. walk ?agent ?from-location ?to-location
+   Example: (walk agent kitchen bedroom)
+
+2. find-object ?agent ?object ?room
+   Example: (find-object agent computer bedroom)
 
-@contextmanager
-def timeout(seconds):
-    """Timeout context manager using SIGALRM"""
-    def timeout_handler(signum, frame):
-        raise TimeoutError(f"Operation timed out after {seconds} seconds")
+3. sit-down ?agent ?furniture
+   Example: (sit-down agent chair)
 
-    original_handler = signal.signal(signal.SIGALRM, timeout_handler)
-    signal.alarm(seconds)
+4. switch-on ?agent ?appliance
+   Example: (switch-on agent computer)
 
-    try:
-        yield
-    finally:
-        signal.alarm(0)
-        signal.signal(signal.SIGALRM, original_handler)
+5. switch-off ?agent ?appliance
+   Example: (switch-off agent tv)
+
+6. touch-object ?agent ?object
+   Example: (touch-object agent remote_control)
+
+7. open-container ?agent ?container
+   Example: (open-container agent fridge)
+
+8. close-container ?agent ?container
+   Example: (close-container agent fridge)
+
+9. grab-object ?agent ?object
+   Example: (grab-object agent apple)
+
+10. put-object-in ?agent ?object ?container
+    Example: (put-object-in agent apple fridge)
+
+CRITICAL RULES:
+- Use EXACT action names above (e.g., "find-object" NOT "find", "switch-on" NOT "switchon")
+- ONLY use switch-on/switch-off on objects with SWITCHON/SWITCHOFF in their action list
+- Objects with only TOUCH actions cannot be switched - use touch-object instead
+- Check the "AVAILABLE OBJECTS & ACTIONS" list below to see what each object can do
+
+PLANNING APPROACH:
+1. **Understand the task** - What is the desired end state?
+2. **Identify required objects** - Which objects from the list below are needed?
+3. **Proper action sequencing**:
+   - Always WALK to room before finding objects there
+   - Always FIND object before interacting with it
+   - For sitting + switching: Find furniture, SIT, then FIND and interact with nearby objects
+   - For grabbing: FIND object, GRAB, then use it (don't sit before grabbing)
+   - Find containers BEFORE opening them
+4. **Generate minimal plan** - Fewest actions to achieve the goal
+5. **Use EXACT action names** - Match the action list exactly
+6. **Use only listed objects** - No assumptions about unavailable objects
+
+EXAMPLES OF GOAL INFERENCE:
+- "Write an email" → Goal: Agent sitting at computer, computer ON
+- "Put groceries in fridge" → Goal: Fridge opened, items inside, fridge closed
+- "Watch TV" → Goal: Agent sitting, TV ON
+- "Go to sleep" → Goal: Agent in bedroom, on bed
+- "Turn on light" → Goal: Agent in room, light/appliance ON
+
+OUTPUT FORMAT:
+(:plan
+  (action agent param1 param2)
+  ...
+)
+"""
+
+# One action per line, e.g. "(walk agent kitchen bedroom)"; the "(:plan" wrapper is skipped
+_PLAN_ACTION_RE = re.compile(r'^[ \t]*\((?!:plan)[ \t]*([^\s()]+)(.*)\)[ \t\r]*$', re.MULTILINE)
+
+# Valid actions from domain, with their parameter counts
+_VALID_ACTIONS = {
+    'walk': 3,
+    'find-object': 3,
+    'sit-down': 2,
+    'switch-on': 2,
+    'switch-off': 2,
+    'touch-object': 2,
+    'open-container': 2,
+    'close-container': 2,
+    'grab-object': 2,
+    'put-object-in': 3
+}
+
+# Number of objects listed in the prompt's capability section
+_MAX_PROMPT_OBJECTS = 30
+
+_WORD_RE = re.compile(r'\w+')
+
+
+# Shared GenerativeModel instances keyed by model name, so planners reuse one client
+_MODELS = {}
+
+
+def get_model(model_name):
+    """
+    Get the shared Gemini model for a model name, creating it on first use.
+
+    Args:
+        model_name: Gemini model name
+
+    Returns:
+        genai.GenerativeModel: Model instance shared by all planners
+    """
+    model = _MODELS.get(model_name)
+    if model is None:
+        model = _MODELS[model_name] = genai.GenerativeModel(model_name)
+    return model
+
+
+def _format_capability(obj_name, obj_caps):
+    """
+    Format one object's capabilities for the planning prompt.
+
+    Args:
+        obj_name: Object name
+        obj_caps: Dict with 'actions', 'properties' and 'states' lists
+
+    Returns:
+        str: "objectname(properties)[current_states] -> valid_actions"
+    """
+    properties = obj_caps['properties']
+    states = obj_caps['states']
+
+    desc = obj_name
+    if properties:
+        desc += f"({','.join(properties)})"
+    if states:
+        desc += f"[{','.join(states)}]"
+    return desc + f" -> {', '.join(obj_caps['actions'])}"
+
+
+def _relevant_capabilities(capabilities, task):
+    """
+    Pick the objects most relevant to a task for the planning prompt.
+
+    Objects are ranked by how many of their name parts and actions appear in
+    the task title and description, and the top ones are returned sorted by
+    name.
+
+    Args:
+        capabilities: Object capabilities dict
+        task: Task dictionary with 'title' and 'description'
+
+    Returns:
+        list: (obj_name, obj_caps) pairs, at most _MAX_PROMPT_OBJECTS long
+    """
+    task_words = set(_WORD_RE.findall(f"{task['title']} {task['description']}".lower()))
+
+    def relevance(item):
+        obj_name, obj_caps = item
+        obj_words = set(obj_name.lower().split('_'))
+        obj_words.update(action.lower() for action in obj_caps['actions'])
+        return len(task_words & obj_words)
+
+    return sorted(heapq.nlargest(_MAX_PROMPT_OBJECTS, capabilities.items(), key=relevance))
 
 
 class LLMPlanner:
@@ -49,18 +192,23 @@ class LLMPlanner:
         Initialize the LLM planner.
 
         Args:
-            model: Google Generative AI model instance
+            model: Google Generative AI model instance, or a model name to use
+                the shared instance from get_model
             scene_objects: Dictionary with scene object information (optional)
             virtualhome_domain: PDDL domain definition (optional)
         """
-        self.model = model
+        self.model = get_model(model) if isinstance(model, str) else model
         self.scene_objects = scene_objects or {}
         self.virtualhome_domain = virtualhome_domain or ""
+        self._plan_cache = {}  # plan key -> validated PDDL solution
 
-    def solve_pddl_with_llm(self, pddl_problem, task):
+    async def solve_pddl_with_llm(self, pddl_problem, task):
         """
         Use Gemini to solve PDDL problem.
 
+        The Gemini request is awaited, so several tasks can be planned
+        concurrently (e.g. with asyncio.gather).
+
         Args:
             pddl_problem: PDDL problem string
             task: Task dictionary with 'title', 'description', 'task_id'
@@ -75,39 +223,26 @@ class LLMPlanner:
 
         # Get available objects and their capabilities from the scene
         capabilities = self.scene_objects.get('capabilities', {})
+        rooms = self.scene_objects.get('rooms', [])
 
-        # Build generic capability description for LLM
-        capability_descriptions = []
-
-        for obj_name, obj_caps in sorted(capabilities.items()):
-            actions = obj_caps['actions']
-            properties = obj_caps['properties']
-            states = obj_caps['states']
-
-            # Format: objectname(properties)[current_states] -> valid_actions
-            props_str = ','.join(properties) if properties else ''
-            states_str = ','.join(states) if states else ''
-            actions_str = ', '.join(actions)
-
-            desc = f"{obj_name}"
-            if props_str:
-                desc += f"({props_str})"
-            if states_str:
-                desc += f"[{states_str}]"
-            desc += f" -> {actions_str}"
-
-            capability_descriptions.append(desc)
+        # Reuse the plan if this exact task was already solved for this scene
+        plan_key = self._plan_key(pddl_problem, task, capabilities, rooms)
+        cached_solution = self._plan_cache.get(plan_key)
+        if cached_solution is not None:
+            print("✅ Reusing cached PDDL solution for identical task and scene")
+            return cached_solution
 
         # Group objects by rooms for spatial understanding
-        rooms = self.scene_objects.get('rooms', [])
         rooms_str = ', '.join(rooms) if rooms else 'none available'
 
-        # Format capability descriptions for prompt
-        capabilities_text = '\n'.join(capability_descriptions[:50])  # Limit to 50 most relevant
-
-        solve_prompt = f"""
-You are a PDDL planner for VirtualHome simulator.
+        # Format capability descriptions for prompt, only for the objects relevant to the task
+        capabilities_text = '\n'.join(
+            _format_capability(obj_name, obj_caps)
+            for obj_name, obj_caps in _relevant_capabilities(capabilities, task)
+        )
 
+        # Static instructions go first so every request shares the same prefix
+        solve_prompt = f"""{_PLANNER_INSTRUCTIONS}
 TASK TO ACCOMPLISH:
 {task['title']} - {task['description']}
 
@@ -119,72 +254,9 @@ Available rooms: {rooms_str}
 AVAILABLE OBJECTS & ACTIONS:
 {capabilities_text}
 
-VALID PDDL ACTIONS (use EXACT names):
-1. walk ?agent ?from-location ?to-location
-   Example: (walk agent kitchen bedroom)
-
-2. find-object ?agent ?object ?room
-   Example: (find-object agent computer bedroom)
-
-3. sit-down ?agent ?furniture
-   Example: (sit-down agent chair)
-
-4. switch-on ?agent ?appliance
-   Example: (switch-on agent computer)
-
-5. switch-off ?agent ?appliance
-   Example: (switch-off agent tv)
-
-6. touch-object ?agent ?object
-   Example: (touch-object agent remote_control)
-
-7. open-container ?agent ?container
-   Example: (open-container agent fridge)
-
-8. close-container ?agent ?container
-   Example: (close-container agent fridge)
-
-9. grab-object ?agent ?object
-   Example: (grab-object agent apple)
-
-10. put-object-in ?agent ?object ?container
-    Example: (put-object-in agent apple fridge)
-
-CRITICAL RULES:
-- Use EXACT action names above (e.g., "find-object" NOT "find", "switch-on" NOT "switchon")
-- ONLY use switch-on/switch-off on objects with SWITCHON/SWITCHOFF in their action list
-- Objects with only TOUCH actions cannot be switched - use touch-object instead
-- Check the "AVAILABLE OBJECTS & ACTIONS" list to see what each object can do
-
-PLANNING APPROACH:
-1. **Understand the task** - What is the desired end state?
-2. **Identify required objects** - Which objects from the list above are needed?
-3. **Proper action sequencing**:
-   - Always WALK to room before finding objects there
-   - Always FIND object before interacting with it
-   - For sitting + switching: Find furniture, SIT, then FIND and interact with nearby objects
-   - For grabbing: FIND object, GRAB, then use it (don't sit before grabbing)
-   - Find containers BEFORE opening them
-4. **Generate minimal plan** - Fewest actions to achieve the goal
-5. **Use EXACT action names** - Match the action list exactly
-6. **Use only listed objects** - No assumptions about unavailable objects
-
-EXAMPLES OF GOAL INFERENCE:
-- "Write an email" → Goal: Agent sitting at computer, computer ON
-- "Put groceries in fridge" → Goal: Fridge opened, items inside, fridge closed
-- "Watch TV" → Goal: Agent sitting, TV ON
-- "Go to sleep" → Goal: Agent in bedroom, on bed
-- "Turn on light" → Goal: Agent in room, light/appliance ON
-
 PDDL PROBLEM (for context - goal is in the task description):
 {pddl_problem}
 
-OUTPUT FORMAT:
-(:plan
-  (action agent param1 param2)
-  ...
-)
-
 Generate the shortest plan that achieves the goal described in the task above.
 Use ONLY the exact action names listed above and objects from the available objects list.
 """
@@ -192,19 +264,28 @@ Use ONLY the exact action names listed above and objects from the available obje
         max_retries = 3
         llm_timeout = 60  # seconds
 
+        # Retries continue the conversation: the original prompt and the rejected
+        # plan become chat history and only the new errors are sent
+        message = solve_prompt
+        history = None
+
         for attempt in range(max_retries):
             try:
                 print(f"  Attempt {attempt + 1}/{max_retries}... (timeout: {llm_timeout}s)")
 
-                with timeout(llm_timeout):
-                    response = self.model.generate_content(solve_prompt)
-                    pddl_solution = response.text
+                pddl_solution = await asyncio.wait_for(
+                    self._stream_plan(message, history),
+                    timeout=llm_timeout
+                )
 
                 if not pddl_solution or len(pddl_solution.strip()) < 10:
                     raise ValueError("LLM returned empty or invalid response")
 
-                # Validate the plan with object capabilities
-                valid, errors = self._validate_pddl_plan(pddl_solution, capabilities)
+                # Validate the plan with object capabilities; on the last attempt the
+                # errors are not sent back to the LLM, so the first one is enough
+                valid, errors = self._validate_pddl_plan(
+                    pddl_solution, capabilities, fail_fast=attempt == max_retries - 1
+                )
 
                 if not valid:
                     print("  ⚠️ LLM generated invalid plan:")
@@ -213,7 +294,11 @@ Use ONLY the exact action names listed above and objects from the available obje
 
                     if attempt < max_retries - 1:
                         print(f"  Retrying with stricter prompt...")
-                        solve_prompt += f"\n\nPREVIOUS ATTEMPT HAD ERRORS:\n" + "\n".join(errors)
+                        history = [
+                            {'role': 'user', 'parts': [solve_prompt]},
+                            {'role': 'model', 'parts': [pddl_solution]},
+                        ]
+                        message = "PREVIOUS ATTEMPT HAD ERRORS:\n" + "\n".join(errors)
                         continue
                     else:
                         raise ValueError(f"LLM failed to generate valid plan after {max_retries} attempts:\n" + "\n".join(errors))
@@ -221,10 +306,11 @@ Use ONLY the exact action names listed above and objects from the available obje
                 print(f"✅ PDDL Solution validated ({len(pddl_solution)} chars)")
                 print("PDDL Plan:")
                 print(pddl_solution)
+                self._plan_cache[plan_key] = pddl_solution
                 break
 
-            except TimeoutError as e:
-                print(f"  ❌ Timeout: {e}")
+            except asyncio.TimeoutError:
+                print(f"  ❌ Timeout: Operation timed out after {llm_timeout} seconds")
                 if attempt < max_retries - 1:
                     print(f"  Retrying...")
                     continue
@@ -247,29 +333,159 @@ Use ONLY the exact action names listed above and objects from the available obje
                 else:
                     raise
 
-        # Save PDDL solution to task-specific directory
+        # Save PDDL solution to task-specific directory, off the event loop
         task_dir = f"Output/task_{task['task_id']}"
-        os.makedirs(task_dir, exist_ok=True)
-        solution_filename = os.path.join(task_dir, "pddl_solution.txt")
         try:
-            with open(solution_filename, 'w') as f:
-                f.write(f"Task: {task['title']} - {task['description']}\n")
-                f.write("=" * 60 + "\n")
-                f.write("PDDL SOLUTION:\n")
-                f.write("=" * 60 + "\n")
-                f.write(pddl_solution)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._save_solution, task_dir, task, pddl_solution)
         except Exception as e:
             print(f"Warning: Could not save PDDL solution file: {e}")
 
         return pddl_solution
 
-    def _validate_pddl_plan(self, pddl_solution, capabilities=None):
+    def _save_solution(self, task_dir, task, pddl_solution):
+        """
+        Write a PDDL solution file for a task (blocking).
+
+        Args:
+            task_dir: Task output directory
+            task: Task dictionary with 'title' and 'description'
+            pddl_solution: PDDL solution string
+        """
+        os.makedirs(task_dir, exist_ok=True)
+        solution_filename = os.path.join(task_dir, "pddl_solution.txt")
+        separator = "=" * 60
+        with open(solution_filename, 'w') as f:
+            f.write(
+                f"Task: {task['title']} - {task['description']}\n"
+                f"{separator}\nPDDL SOLUTION:\n{separator}\n{pddl_solution}"
+            )
+
+    async def _stream_plan(self, prompt, history=None):
+        """
+        Stream a plan from Gemini and stop reading once it is usable.
+
+        Generation is abandoned as soon as the (:plan block is closed, or as
+        soon as a completed line uses an unknown action name, so a bad plan
+        can be retried without waiting for the rest of the response.
+
+        Args:
+            prompt: Planning prompt, or the follow-up message when history is given
+            history: Earlier chat turns to continue from (optional)
+
+        Returns:
+            str: Generated text received so far
+        """
+        if history:
+            chat = self.model.start_chat(history=history)
+            response = await chat.send_message_async(prompt, stream=True)
+        else:
+            response = await self.model.generate_content_async(prompt, stream=True)
+        buffer = ''
+        checked = 0  # Start of the first line not yet checked for action names
+
+        async for chunk in response:
+            buffer += chunk.text
+
+            plan_start = buffer.find('(:plan')
+            if plan_start != -1:
+                plan = buffer[plan_start:]
+                if plan.count('(') == plan.count(')'):
+                    break
+
+            line_end = buffer.rfind('\n')
+            if line_end > checked:
+                unknown_action = any(
+                    match.group(1).lower() not in _VALID_ACTIONS
+                    for match in _PLAN_ACTION_RE.finditer(buffer, checked, line_end)
+                )
+                checked = line_end + 1
+                if unknown_action:
+                    print("  ⚠️ Unknown action in streamed plan, stopping generation early")
+                    break
+
+        return buffer
+
+    def _plan_key(self, pddl_problem, task, capabilities, rooms):
+        """
+        Build the plan cache key for a task against the current scene.
+
+        Args:
+            pddl_problem: PDDL problem string
+            task: Task dictionary
+            capabilities: Object capabilities dict
+            rooms: List of room names
+
+        Returns:
+            bytes: Digest identifying the planning request
+        """
+        key_data = {
+            'task': [task['task_id'], task['title'], task['description']],
+            'problem': pddl_problem,
+            'capabilities': capabilities,
+            'rooms': rooms,
+        }
+        payload = json.dumps(key_data, sort_keys=True, default=str).encode()
+        return hashlib.blake2b(payload, digest_size=16).digest()
+
+    async def solve_many(self, items, concurrency=None):
+        """
+        Solve several PDDL problems concurrently against the current scene objects.
+
+        Args:
+            items: Iterable of (pddl_problem, task) pairs
+            concurrency: Maximum number of in-flight Gemini requests
+                (defaults to GEMINI_CONCURRENCY env var, or 8)
+
+        Returns:
+            list: PDDL solution plans in the order of items; a failed task
+                yields its exception instead of a plan
+        """
+        if concurrency is None:
+            concurrency = int(os.getenv('GEMINI_CONCURRENCY', '8'))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def solve_one(pddl_problem, task):
+            async with semaphore:
+                return await self.solve_pddl_with_llm(pddl_problem, task)
+
+        return await asyncio.gather(
+            *[solve_one(pddl_problem, task) for pddl_problem, task in items],
+            return_exceptions=True
+        )
+
+    def _capability_sets(self, capabilities):
+        """
+        Get the switchable and grabbable object sets for a capabilities dict.
+
+        Args:
+            capabilities: Object capabilities dict (may be None)
+
+        Returns:
+            tuple: (switchable_objects: frozenset, grabbable_objects: frozenset)
+        """
+        if not capabilities:
+            return frozenset(), frozenset()
+
+        switchable = []
+        grabbable = []
+        for obj_name, obj_caps in capabilities.items():
+            actions_list = obj_caps.get('actions', ())
+            if 'SWITCHON' in actions_list or 'SWITCHOFF' in actions_list:
+                switchable.append(obj_name)
+            if 'GRAB' in actions_list:
+                grabbable.append(obj_name)
+
+        return frozenset(switchable), frozenset(grabbable)
+
+    def _validate_pddl_plan(self, pddl_solution, capabilities=None, fail_fast=False):
         """
         Validate LLM-generated PDDL plan with type checking.
 
         Args:
             pddl_solution: PDDL solution string
             capabilities: Object capabilities dict (optional for type checking)
+            fail_fast: Stop at the first error instead of collecting all of them
 
         Returns:
             tuple: (is_valid: bool, errors: list of str)
@@ -277,56 +493,32 @@ Use ONLY the exact action names listed above and objects from the available obje
         validation_errors = []
 
         # Extract actions from solution
-        actions = []
-        for line in pddl_solution.strip().split('\n'):
-            line = line.strip()
-            if line.startswith('(') and not line.startswith('(:plan'):
-                if line.endswith(')'):
-                    line = line[1:-1]
-                    parts = line.split()
-                    if parts:
-                        actions.append((parts[0], parts[1:]))
+        actions = [
+            (match.group(1), match.group(2).split())
+            for match in _PLAN_ACTION_RE.finditer(pddl_solution)
+        ]
 
         if not actions:
             validation_errors.append("No actions found in plan")
             return False, validation_errors
 
-        # Valid actions from domain
-        valid_actions = {
-            'walk': 3,
-            'find-object': 3,
-            'sit-down': 2,
-            'switch-on': 2,
-            'switch-off': 2,
-            'touch-object': 2,
-            'open-container': 2,
-            'close-container': 2,
-            'grab-object': 2,
-            'put-object-in': 3
-        }
-
         # Build capabilities lookup if provided
-        switchable_objects = set()
-        grabbable_objects = set()
-        if capabilities:
-            for obj_name, obj_caps in capabilities.items():
-                actions_list = obj_caps.get('actions', [])
-                if 'SWITCHON' in actions_list or 'SWITCHOFF' in actions_list:
-                    switchable_objects.add(obj_name)
-                if 'GRAB' in actions_list:
-                    grabbable_objects.add(obj_name)
+        switchable_objects, grabbable_objects = self._capability_sets(capabilities)
 
         # Validate each action
         for i, (action_name, params) in enumerate(actions):
+            if fail_fast and validation_errors:
+                break
+
             action_name_lower = action_name.lower()
 
-            if action_name_lower not in valid_actions:
+            if action_name_lower not in _VALID_ACTIONS:
                 validation_errors.append(
                     f"Action {i+1}: Unknown action '{action_name}'"
                 )
                 continue
 
-            expected_params = valid_actions[action_name_lower]
+            expected_params = _VALID_ACTIONS[action_name_lower]
             if len(params) != expected_params:
                 validation_errors.append(
                     f"Action {i+1}: '{action_name}' expects {expected_params} parameters, got {len(params)}"
@@ -8,6 +8,33 @@ It ensures that objects required by the plan are present in the VirtualHome envi
 
 import re
 
+# Matches "<object> (id)" references in a VirtualHome script line
+_OBJECT_REF_RE = re.compile(r'<(\w+)> \((\d+)\)')
+
+# Script references to the agent rather than to scene objects
+_CHARACTER_NAMES = frozenset({'char0', 'character'})
+
+# Common missing objects and their VirtualHome counterparts
+_SPAWN_MAPPINGS = {
+    # Food & Kitchen Items
+    'book': {'class_name': 'book', 'category': 'Books', 'properties': ('GRABBABLE', 'READABLE')},
+    'groceries': {'class_name': 'food_apple', 'category': 'Food', 'properties': ('GRABBABLE', 'EATABLE')},
+    'cereal': {'class_name': 'cereal', 'category': 'Food', 'properties': ('GRABBABLE', 'EATABLE')},
+    'plate': {'class_name': 'plate', 'category': 'Plates', 'properties': ('GRABBABLE', 'SURFACES')},
+    'glass': {'class_name': 'glass', 'category': 'Glasses', 'properties': ('GRABBABLE', 'RECIPIENT', 'DRINKABLE')},
+    'cup': {'class_name': 'mug', 'category': 'Mugs', 'properties': ('GRABBABLE', 'RECIPIENT')},
+    'water': {'class_name': 'waterglass', 'category': 'Glasses', 'properties': ('GRABBABLE', 'DRINKABLE')},
+
+    # Electronics
+    'phone': {'class_name': 'cellphone', 'category': 'Electronics', 'properties': ('GRABBABLE', 'HAS_SWITCH')},
+    'remote': {'class_name': 'remotecontrol', 'category': 'Electronics', 'properties': ('GRABBABLE',)},
+    'remotecontrol': {'class_name': 'remotecontrol', 'category': 'Electronics', 'properties': ('GRABBABLE',)},
+
+    # Note: Large appliances (fridge, tv, sofa) and rooms (kitchen, bedroom, livingroom)
+    # should NOT be spawned as they are typically part of the base scene.
+    # If they're missing, it indicates a scene configuration issue, not a spawning need.
+}
+
 
 class ObjectManager:
     """
@@ -48,9 +75,9 @@ class ObjectManager:
         for line in vh_script:
             # Match patterns like [FIND] <object> (id) or [GRAB] <object> (id)
             # Capture object name and ID separately
-            obj_matches = re.findall(r'<(\w+)> \((\d+)\)', line)
+            obj_matches = _OBJECT_REF_RE.findall(line)
             for obj_name, obj_id in obj_matches:
-                if obj_name not in ['char0', 'character']:
+                if obj_name not in _CHARACTER_NAMES:
                     script_objects_with_ids[obj_name] = int(obj_id)
 
         # Only consider objects with ID = 1 as "missing" (fallback ID from script_converter)
@@ -76,59 +103,43 @@ class ObjectManager:
         if not missing_objects:
             return scene_graph
 
+        # Callers may pass the same name more than once; spawn each only once
+        missing_objects = list(dict.fromkeys(missing_objects))
+
         print(f"\n🎨 SPAWNING MISSING OBJECTS: {', '.join(missing_objects)}")
 
-        # Common missing objects and their VirtualHome counterparts
-        spawn_mappings = {
-            # Food & Kitchen Items
-            'book': {'class_name': 'book', 'category': 'Books', 'properties': ['GRABBABLE', 'READABLE']},
-            'groceries': {'class_name': 'food_apple', 'category': 'Food', 'properties': ['GRABBABLE', 'EATABLE']},
-            'cereal': {'class_name': 'cereal', 'category': 'Food', 'properties': ['GRABBABLE', 'EATABLE']},
-            'plate': {'class_name': 'plate', 'category': 'Plates', 'properties': ['GRABBABLE', 'SURFACES']},
-            'glass': {'class_name': 'glass', 'category': 'Glasses', 'properties': ['GRABBABLE', 'RECIPIENT', 'DRINKABLE']},
-            'cup': {'class_name': 'mug', 'category': 'Mugs', 'properties': ['GRABBABLE', 'RECIPIENT']},
-            'water': {'class_name': 'waterglass', 'category': 'Glasses', 'properties': ['GRABBABLE', 'DRINKABLE']},
-
-            # Electronics
-            'phone': {'class_name': 'cellphone', 'category': 'Electronics', 'properties': ['GRABBABLE', 'HAS_SWITCH']},
-            'remote': {'class_name': 'remotecontrol', 'category': 'Electronics', 'properties': ['GRABBABLE']},
-            'remotecontrol': {'class_name': 'remotecontrol', 'category': 'Electronics', 'properties': ['GRABBABLE']},
-
-            # Note: Large appliances (fridge, tv, sofa) and rooms (kitchen, bedroom, livingroom)
-            # should NOT be spawned as they are typically part of the base scene.
-            # If they're missing, it indicates a scene configuration issue, not a spawning need.
-        }
-
-        # Find a suitable location to spawn objects (kitchen table or counter)
+        # Single pass over the scene: first table/counter surface, first kitchen
+        # node (fallback spawn location), and the highest node ID
         spawn_location = None
+        kitchen_node = None
+        max_id = 0
         for node in scene_graph['nodes']:
-            if 'table' in node['class_name'].lower() or 'counter' in node['class_name'].lower():
-                if 'SURFACES' in node.get('properties', []):
+            class_lower = node['class_name'].lower()
+            if spawn_location is None and ('table' in class_lower or 'counter' in class_lower):
+                if 'SURFACES' in node.get('properties', ()):
                     spawn_location = node
-                    break
+            if kitchen_node is None and 'kitchen' in class_lower:
+                kitchen_node = node
+            if node['id'] > max_id:
+                max_id = node['id']
 
         if not spawn_location:
             # Default to kitchen if no table found
-            for node in scene_graph['nodes']:
-                if 'kitchen' in node['class_name'].lower():
-                    spawn_location = node
-                    break
+            spawn_location = kitchen_node
 
         # Get next available ID
-        max_id = max(node['id'] for node in scene_graph['nodes'])
         next_id = max_id + 1
 
         # Add missing objects to scene graph
         new_nodes = []
         for obj in missing_objects:
-            obj_lower = obj.lower()
-            if obj_lower in spawn_mappings:
-                spawn_info = spawn_mappings[obj_lower]
+            spawn_info = _SPAWN_MAPPINGS.get(obj.lower())
+            if spawn_info is not None:
                 new_node = {
                     'id': next_id,
                     'class_name': spawn_info['class_name'],
                     'category': spawn_info['category'],
-                    'properties': spawn_info['properties'],
+                    'properties': list(spawn_info['properties']),
                     'states': [],
                     'bounding_box': spawn_location.get('bounding_box', {}) if spawn_location else {}
                 }
@@ -159,3 +170,34 @@ class ObjectManager:
                 return scene_graph
 
         return scene_graph
+
+    def spawn_batch(self, batch):
+        """
+        Spawn missing objects for several tasks with one expand_scene call.
+
+        The simulator holds a single scene, so all tasks in the batch must share
+        the same scene graph; their missing objects are unioned and spawned once.
+
+        Args:
+            batch: List of (missing_objects, scene_graph, task) tuples
+
+        Returns:
+            dict: task_id -> updated scene graph
+
+        Raises:
+            ValueError: If the tasks do not all share one scene graph
+        """
+        if not batch:
+            return {}
+
+        scene_graph = batch[0][1]
+        task = batch[0][2]
+        if any(graph is not scene_graph for _, graph, _ in batch):
+            raise ValueError("spawn_batch requires all tasks to share one scene graph")
+
+        missing = {}
+        for missing_objects, _, _ in batch:
+            missing.update(dict.fromkeys(missing_objects))
+
+        updated_graph = self._spawn_missing_objects(list(missing), scene_graph, task)
+        return {batch_task['task_id']: updated_graph for _, _, batch_task in batch}
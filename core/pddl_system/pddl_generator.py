@@ -1,23 +1,93 @@
 #!/usr/bin/env python3
 """PDDL problem generation module"""
 
+import asyncio
+import hashlib
+import json
 import os
 
 from tqdm import tqdm
 
 from ENV_VARS import PROJECT_PATH, GEMINI_MODEL_NAME, GEMINI_API_KEY
 
+# Scene objects kept in every problem, whatever the LLM relevance filter says
+_ALWAYS_KEEP_OBJECTS = ('character', 'floor')
+
+# Object types decided by the node category alone
+_CATEGORY_TYPES = {"Rooms": "room", "Characters": "agent"}
+
+# Object types by the properties they require, in priority order
+_PROPERTY_TYPES = (
+    (frozenset({"CAN_OPEN", "CONTAINERS"}), "container-objectt"),
+    (frozenset({"HAS_SWITCH"}), "switchable-objectt"),
+    (frozenset({"SURFACES"}), "surface-objectt"),
+    (frozenset({"GRABBABLE"}), "grabbable-objectt"),
+    (frozenset({"SITTABLE"}), "sittable-objectt"),
+)
+
+# Edge relations that do not pull a connected object into the problem
+_NON_LINKING_RELATIONS = frozenset({"CLOSE", "FACING", "BETWEEN"})
+
+# Object types that can be close to each other
+_OBJECT_TYPES = frozenset({"objectt", "sittable-objectt", "switchable-objectt", "container-objectt",
+                           "surface-objectt", "grabbable-objectt", "static-objectt"})
+
+# Object types that are always reachable
+_ALWAYS_REACHABLE_TYPES = frozenset({"surface-objectt", "container-objectt"})
+
+# Object types that are placed on the floor of their room when not on/in anything
+_PLACEABLE_TYPES = frozenset({"grabbable-objectt", "sittable-objectt", "switchable-objectt", "container-objectt"})
+
+# Edge relations that place an object on or in another object
+_PLACEMENT_RELATIONS = frozenset({"ON", "INSIDE"})
+
+# Lifetime of the Gemini cache holding the per-object goal prompt prefix
+_DOMAIN_CACHE_TTL = "600s"
+
+# Objects decided per structured goal request; batches are sent concurrently
+_OBJECT_GOAL_BATCH_SIZE = 25
+
 
 class PDDLGenerator:
     """Generates PDDL problems from VirtualHome scenes"""
 
 
-    VIRTUALHOME_PDDL_DOMAIN_PATH = PROJECT_PATH + r"core\pddl_system\virtualhome_pddl_domain.pddl"
-    with open(VIRTUALHOME_PDDL_DOMAIN_PATH, 'r') as f:
-        virtualhome_domain_pddl = f.read()
+    VIRTUALHOME_PDDL_DOMAIN_PATH = os.path.join(PROJECT_PATH, "core", "pddl_system", "virtualhome_pddl_domain.pddl")
+    _base_domain_pddl = None  # domain file contents, read on first use
+
+    PDDL_TASKS_DIR = os.path.join(PROJECT_PATH, "core", "pddl_system", "tasks")
 
     def __init__(self):
+        self._domain_pddl = None  # domain replaced by enrich_domain, if any
         self.current_scene_objects = {}
+        self._problem_cache = {}  # problem key -> generated PDDL problem
+        self._relevance_cache = {}  # (task description, scene object names) -> relevance dict
+        self._object_goal_cache = {}  # (task description, domain PDDL, object name) -> LLM goal answer
+        os.makedirs(self.PDDL_TASKS_DIR, exist_ok=True)
+
+    @classmethod
+    def load_domain(cls) -> str:
+        """
+        Read the base VirtualHome PDDL domain, once per process.
+
+        Returns:
+            str: Domain PDDL
+        """
+        if cls._base_domain_pddl is None:
+            with open(cls.VIRTUALHOME_PDDL_DOMAIN_PATH, 'r') as f:
+                cls._base_domain_pddl = f.read()
+        return cls._base_domain_pddl
+
+    @property
+    def virtualhome_domain_pddl(self) -> str:
+        """Domain PDDL used by this generator: the base domain unless enrich_domain replaced it."""
+        if self._domain_pddl is None:
+            return self.load_domain()
+        return self._domain_pddl
+
+    @virtualhome_domain_pddl.setter
+    def virtualhome_domain_pddl(self, domain_pddl):
+        self._domain_pddl = domain_pddl
 
     def enrich_domain(self, task) -> str:
         """
@@ -129,17 +199,137 @@ Goal PDDL:
         objects_section = self.pddl_problem.split("(:objects")[1].split(")")[0]
         objects = [line.split("-")[0].strip() for line in objects_section.split("\n") if line.strip()]
 
-        # Generate object-specific goals
+        # Generate object-specific goals. Answers are reused when the same task is
+        # converted again against the same domain; the remaining objects are asked
+        # in concurrent batches
+        domain = self.virtualhome_domain_pddl
+        uncached_objects = [obj for obj in objects
+                            if (task_description, domain, obj) not in self._object_goal_cache]
+        if uncached_objects:
+            new_goals = asyncio.run(self._generate_object_goals(client, uncached_objects))
+            for obj, obj_goal in new_goals.items():
+                self._object_goal_cache[(task_description, domain, obj)] = obj_goal
+
         object_goals = []
-        for obj in tqdm(objects, desc="Generating Goal PDDL for Objects"):
-            obj_prompt = f"""
+        for obj in objects:
+            obj_goal = self._object_goal_cache[(task_description, domain, obj)]
+            if "false" not in obj_goal.lower():
+                object_goals.append(obj_goal)
+                # print("obj_goal", obj, obj_goal)
+                print(f"Added object-specific goal for '{obj}': {obj_goal}")
+            else:
+                # print("obj_goal", obj, "false")
+                pass
+
+        # Combine the main goal with object-specific goals
+        object_goals_text = '\n'.join(object_goals)
+        combined_goal_pddl = f"""
+    (and
+    {main_goal_pddl}
+    {object_goals_text}
+    )
+        """
+        print(f"Generated Combined Goal PDDL: {combined_goal_pddl}")
+        return combined_goal_pddl
+
+    async def _generate_object_goals(self, client, objects):
+        """
+        Ask the LLM for the goals of several objects, in concurrent batches.
+
+        Args:
+            client: google-genai client
+            objects: PDDL object names
+
+        Returns:
+            dict: object name -> LLM goal answer
+        """
+        semaphore = asyncio.Semaphore(int(os.getenv('GEMINI_CONCURRENCY', '8')))
+        batches = [objects[i:i + _OBJECT_GOAL_BATCH_SIZE]
+                   for i in range(0, len(objects), _OBJECT_GOAL_BATCH_SIZE)]
+
+        # Every batch prompt starts with the same domain text, so cache it once
+        # on the Gemini side and send only the short per-batch tail
+        domain_cache = None
+        if len(batches) > 1:
+            try:
+                domain_cache = await client.aio.caches.create(
+                    model=GEMINI_MODEL_NAME,
+                    config={
+                        'contents': [self._object_goal_prefix()],
+                        'ttl': _DOMAIN_CACHE_TTL,
+                    },
+                )
+            except Exception as e:
+                # e.g. the prompt prefix is below the model's minimum cache size
+                print(f"Domain prompt caching unavailable, sending full prompts: {e}")
+
+        progress = tqdm(total=len(batches), desc="Generating Goal PDDL for Objects")
+
+        async def generate_batch(batch):
+            async with semaphore:
+                batch_goals = await self._generate_object_goal_batch(client, batch, domain_cache)
+            progress.update(1)
+            return batch_goals
+
+        object_goals = {}
+        tasks = [asyncio.create_task(generate_batch(batch)) for batch in batches]
+        try:
+            for batch_goals in await asyncio.gather(*tasks):
+                object_goals.update(batch_goals)
+        except BaseException:
+            # One failed batch (e.g. quota exceeded) fails the call; stop the others
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            progress.close()
+            if domain_cache is not None:
+                try:
+                    await client.aio.caches.delete(name=domain_cache.name)
+                except Exception as e:
+                    print(f"Failed to delete domain prompt cache: {e}")
+        return object_goals
+
+    def _object_goal_prefix(self):
+        """
+        Static head of every object goal prompt (the domain definition).
+
+        Kept byte-identical across batches so it can be served from the prompt cache.
+
+        Returns:
+            str: Prompt prefix
+        """
+        return f"""
 Given the following PDDL domain definition:
 {self.virtualhome_domain_pddl}
+"""
 
-Your task is to determine if the object '{obj}' requires a specific goal state by the end of the task. Follow these guidelines:
+    async def _generate_object_goal_batch(self, client, objects, domain_cache=None):
+        """
+        Ask the LLM, in one structured-output call, which objects need their own goal state.
+
+        Args:
+            client: google-genai client
+            objects: PDDL object names
+            domain_cache: Gemini cached content holding the prompt prefix (optional)
+
+        Returns:
+            dict: object name -> goal condition in PDDL, or "false" if it needs none
+        """
+        from pydantic import BaseModel
+
+        class ObjectGoal(BaseModel):
+            object_name: str
+            has_goal: bool
+            goal_pddl: str | None = None
+
+        obj_prompt = f"""
+Your task is to determine, for each of the following objects, if it requires a specific goal state by the end of the task: {objects}
+Follow these guidelines:
 
 1. **Relevance**:
-   - Assess whether the object '{obj}' needs a dedicated goal state to ensure the task is completed correctly and without side effects.
+   - Assess whether each object needs a dedicated goal state to ensure the task is completed correctly and without side effects.
    - Consider the "do as I mean, not as I say" principle: account for implicit requirements (e.g., closing the fridge after use) even if not explicitly stated.
 
 2. **Logical Consistency**:
@@ -151,40 +341,36 @@ Your task is to determine if the object '{obj}' requires a specific goal state b
    - Ensure the goal condition is syntactically and semantically valid.
 
 4. **Output Format**:
-   - If the object '{obj}' requires a goal state, provide the goal condition in valid PDDL format.
-   - If the object does not require a goal state, respond with `false`.
-   - Do not include any additional text, explanations, or comments.
+   - Provide one decision for every object listed, using its exact name as `object_name`.
+   - If the object requires a goal state, set `has_goal` to true and give the goal condition in valid PDDL format as `goal_pddl`.
+   - If the object does not require a goal state, set `has_goal` to false and leave `goal_pddl` empty.
 
 **Important Notes**:
 - Ensure no side effects (e.g., leaving objects out of place or in an unintended state).
 - Only add a goal condition if it is necessary and makes sense for the task.
-
-Goal condition for '{obj}':
-            """
-            #     and the following task problem file with objects and initial conditions:
-            #     {self.pddl_problem}
-            obj_response = client.models.generate_content(
-                model=GEMINI_MODEL_NAME,
-                contents=obj_prompt,
-            )
-            obj_goal = obj_response.text.strip()
-            if "false" not in obj_goal.lower():
-                object_goals.append(obj_goal)
-                # print("obj_goal", obj, obj_goal)
-                print(f"Added object-specific goal for '{obj}': {obj_goal}")
-            else:
-                # print("obj_goal", obj, "false")
-                pass
-
-        # Combine the main goal with object-specific goals
-        combined_goal_pddl = f"""
-    (and
-    {main_goal_pddl}
-    {'\n'.join(object_goals)}
-    )
         """
-        print(f"Generated Combined Goal PDDL: {combined_goal_pddl}")
-        return combined_goal_pddl
+        config = {
+            "response_mime_type": "application/json",
+            "response_schema": list[ObjectGoal],
+        }
+        if domain_cache is not None:
+            config["cached_content"] = domain_cache.name
+            contents = obj_prompt
+        else:
+            contents = self._object_goal_prefix() + obj_prompt
+        response = await client.aio.models.generate_content(
+            model=GEMINI_MODEL_NAME,
+            contents=contents,
+            config=config,
+        )
+        object_goal_list: list[ObjectGoal] = response.parsed or []
+
+        # Objects the model skipped are treated as needing no goal
+        object_goals = dict.fromkeys(objects, "false")
+        for obj_goal in object_goal_list:
+            if obj_goal.object_name in object_goals and obj_goal.has_goal and obj_goal.goal_pddl:
+                object_goals[obj_goal.object_name] = obj_goal.goal_pddl.strip()
+        return object_goals
 
     # Use LLM to decide which objects in the environment are related to the task and which can be removed
     def condense_scene_graph(self, task_description: str, objects_in_scene: set) -> dict:
@@ -194,6 +380,14 @@ Goal condition for '{obj}':
         :param objects_in_scene: List of object names present in the scene.
         :return: A dictionary containing for each object whether it is relevant or not.
         """
+        # The decision only depends on the task and the set of object names, so a
+        # scene with the same objects reuses it (copied, callers add entries)
+        cache_key = (task_description, frozenset(objects_in_scene))
+        cached_relevance = self._relevance_cache.get(cache_key)
+        if cached_relevance is not None:
+            print("Reusing cached scene relevance for identical task and objects")
+            return dict(cached_relevance)
+
         from google import genai
         from pydantic import BaseModel
         print("Condensing scene graph using LLM...")
@@ -224,7 +418,8 @@ Goal condition for '{obj}':
 
         relevant_objects_dict = {obj.object_name: obj.relevant for obj in relevant_objects_list}
         print(f"Relevant objects: {relevant_objects_dict}")
-        return relevant_objects_dict
+        self._relevance_cache[cache_key] = relevant_objects_dict
+        return dict(relevant_objects_dict)
 
 
     def scene_graph_to_pddl_problem(self, task: str):
@@ -243,18 +438,27 @@ Goal condition for '{obj}':
         # states may be one of: {'CLEAN', 'CLOSED', 'DIRTY', 'OFF', 'ON', 'OPEN', 'PLUGGED_IN', 'PLUGGED_OUT', 'SITTING'}
         # category may be one of: {'Appliances', 'Ceiling', 'Characters', 'Decor', 'Doors', 'Electronics', 'Floor', 'Floors', 'Furniture', 'Lamps', 'Props', 'Rooms', 'Walls', 'Windows', 'placable_objects'}
         scene_graph = task['initial_graph']
+        task_id = task['task_id']
+        task_title = task['title']
 
         if 'nodes' not in scene_graph or not isinstance(scene_graph['nodes'], list):
             raise ValueError("Invalid scene graph format: 'nodes' key missing or not a list")
 
+        # Reuse the problem if this task was already converted for an identical scene
+        problem_key = self._problem_key(task, scene_graph)
+        cached_problem = self._problem_cache.get(problem_key)
+        if cached_problem is not None:
+            print("✅ Reusing cached PDDL problem for identical task and scene")
+            self.pddl_problem = cached_problem
+            return cached_problem
+
         nodes = scene_graph['nodes']
         edges = scene_graph['edges']
         objects = []  # object declarations
-        character_objects = []  # all the objects that are of type character
-        objects_relevant_map = self.condense_scene_graph(task['title'],
-                                                         set([node.get("class_name", f"obj_{node['id']}") for node in nodes]))
-        objects_to_always_keep = ['character', 'floor']
-        for obj_to_keep in objects_to_always_keep:
+        character_objects = set()  # all the objects that are of type character
+        class_names_by_id = {node["id"]: node.get("class_name", f"obj_{node['id']}") for node in nodes}
+        objects_relevant_map = self.condense_scene_graph(task_title, set(class_names_by_id.values()))
+        for obj_to_keep in _ALWAYS_KEEP_OBJECTS:
             objects_relevant_map[obj_to_keep] = True
         objects_to_ignore = set()
         init = []  # initial state predicates
@@ -272,41 +476,45 @@ Goal condition for '{obj}':
             """
             Infer object type based on properties and category
             """
-            props = [p.upper() for p in node.get("properties", [])]
-            category = node.get("category", "object")
             # based on properties and category
             # category may be one of: {'Appliances', 'Ceiling', 'Characters', 'Decor', 'Doors', 'Electronics', 'Floor',
             # 'Floors', 'Furniture', 'Lamps', 'Props', 'Rooms', 'Walls', 'Windows', 'placable_objects'}
             # properties may be one of: {'CAN_OPEN', 'CLOTHES', 'CONTAINERS', 'COVER_OBJECT', 'CUTTABLE', 'DRINKABLE',
             # 'EATABLE', 'GRABBABLE', 'HANGABLE', 'HAS_PAPER', 'HAS_PLUG', 'HAS_SWITCH', 'LIEABLE', 'LOOKABLE',
             # 'MOVABLE', 'POURABLE', 'READABLE', 'RECIPIENT', 'SITTABLE', 'SURFACES'}
+            category_type = _CATEGORY_TYPES.get(node.get("category", "object"))
+            if category_type is not None:
+                return category_type
 
-            if category == "Rooms":
-                return "room"
-            elif category == "Characters":
-                return "agent"
-            elif "CAN_OPEN" in props and "CONTAINERS" in props:
-                return "container-objectt"
-            elif "HAS_SWITCH" in props:
-                return "switchable-objectt"
-            elif "SURFACES" in props:
-                return "surface-objectt"
-            elif "GRABBABLE" in props:
-                return "grabbable-objectt"
-            elif "SITTABLE" in props:
-                return "sittable-objectt"
-            else:
-                # print(node)
-                return "other"
+            props = frozenset(p.upper() for p in node.get("properties", ()))
+            for required_props, obj_type in _PROPERTY_TYPES:
+                if required_props <= props:
+                    return obj_type
+            return "other"
 
 
         obj_types = {}  # map object name to type
 
+        # Index the scene once: outgoing/incoming edges per node and the inferred
+        # type and object name of every node, so the passes below never rescan it
+        types_by_id = {}
+        names_by_id = {}
+        for node in nodes:
+            types_by_id[node["id"]] = infer_type(node)
+            names_by_id[node["id"]] = make_safe_name(node.get("class_name", "obj"), node["id"])
+        # Edges as (from_id, to_id, relation) with the relation uppercased once
+        relations = [(edge["from_id"], edge["to_id"], edge["relation_type"].upper()) for edge in edges]
+        out_edges = {}
+        in_edges = {}
+        for relation in relations:
+            out_edges.setdefault(relation[0], []).append(relation)
+            in_edges.setdefault(relation[1], []).append(relation)
+
         # is object needed for the pddl
         needed_objects = set()
         for node in nodes:
-            obj_type = infer_type(node)
-            obj_name = make_safe_name(node.get("class_name", "obj"), node["id"])
+            obj_type = types_by_id[node["id"]]
+            obj_name = names_by_id[node["id"]]
             if obj_type == "other":
                 continue
 
@@ -316,68 +524,65 @@ Goal condition for '{obj}':
 
             # ✅ PDDL Problem created with 54 objects, 333 init conditions
             # ✅ PDDL Problem created with 168 objects, 1900 init conditions
-            if objects_relevant_map.get(node.get("class_name", f"obj_{node['id']}"), False):
+            if objects_relevant_map.get(class_names_by_id[node["id"]], False):
                 needed_objects.add(obj_name)
                 continue
 
         # for all the nodes that were not added, if they have an edge to a needed object, add them as well
         additional_needed_objects = set()
         for node in nodes:
-            obj_type = infer_type(node)
+            obj_type = types_by_id[node["id"]]
             if obj_type == "other":
                 continue
-            obj_name = make_safe_name(node.get("class_name", "obj"), node["id"])
+            obj_name = names_by_id[node["id"]]
             if obj_name in needed_objects:
                 continue
-            for edge in edges:
-                relation_type = edge["relation_type"].upper()
-                if relation_type in ["CLOSE", "FACING", "BETWEEN"]:
+            for from_id, to_id, relation_type in out_edges.get(node["id"], []) + in_edges.get(node["id"], []):
+                if relation_type in _NON_LINKING_RELATIONS:
                     continue
 
-                if edge["from_id"] == node["id"]:
-                    to_node = next(n for n in nodes if n["id"] == edge["to_id"])
-                    to_obj_name = make_safe_name(to_node.get("class_name", "obj"), to_node["id"])
-                    to_obj_type = infer_type(to_node)
+                if from_id == node["id"]:
+                    to_obj_name = names_by_id[to_id]
+                    to_obj_type = types_by_id[to_id]
                     # if the relation is object INSIDE room skip it
                     if relation_type == "INSIDE" and to_obj_type == "room":
                         continue
                     # if the relation type is ON and the object ON floor skip it
-                    if relation_type == "ON" and "floor" in to_obj_name:
+                    if relation_type == "ON" and class_names_by_id[to_id].lower() == "floor":
                         continue
                     if to_obj_name in needed_objects:
                         additional_needed_objects.add(obj_name)
-                        print(f"Also adding {obj_name} because it connects to needed object {to_obj_name} ({edge})")
+                        print(f"Also adding {obj_name} because it connects to needed object {to_obj_name} ({relation_type})")
                         break
-                elif edge["to_id"] == node["id"]:
-                    from_node = next(n for n in nodes if n["id"] == edge["from_id"])
-                    from_obj_name = make_safe_name(from_node.get("class_name", "obj"), from_node["id"])
+                elif to_id == node["id"]:
+                    from_obj_name = names_by_id[from_id]
                     if from_obj_name in needed_objects:
                         additional_needed_objects.add(obj_name)
-                        print(f"Also adding {obj_name} because it connects to needed object {from_obj_name} ({edge})")
+                        print(f"Also adding {obj_name} because it connects to needed object {from_obj_name} ({relation_type})")
                         break
 
         needed_objects.update(additional_needed_objects)
 
         for node in nodes:
-            obj_type = infer_type(node)
-            obj_name = make_safe_name(node.get("class_name", "obj"), node["id"])
+            obj_type = types_by_id[node["id"]]
+            obj_name = names_by_id[node["id"]]
             if obj_name not in needed_objects:
                 continue
 
             objects.append(f"{obj_name} - {obj_type}")
             node_name_map[node["id"]] = obj_name
             if obj_type == "character":
-                character_objects.append(obj_name)
+                character_objects.add(obj_name)
             elif obj_type == "room":
                 rooms.add(obj_name)
             obj_types[obj_name] = obj_type
 
             # all surfaces and containers are reachable
-            if obj_type in ["surface-objectt", "container-objectt"]:
+            if obj_type in _ALWAYS_REACHABLE_TYPES:
                 init.append(f"(always-reachable {obj_name})")
 
             # possible predicates according to domain: holding, grabbable, drinkable, switchable, on, off, open, closed, sittable, reachable, in-room, in-container, on-surface
-            for state in node.get("states", []):
+            for state in node.get("states", ()):
                 state_upper = state.upper()
                 if state_upper == "OPEN":
                     if obj_type == "container-objectt":
@@ -409,26 +614,18 @@ Goal condition for '{obj}':
 
 
 
-        for edge in edges:
-            # edge has 'from_id', 'to_id', 'relation_type'
+        for from_id, to_id, rel_type in relations:
             # relation_type may be one of: {'BETWEEN', 'CLOSE', 'FACING', 'INSIDE', 'ON'}
-            from_node = next(n for n in nodes if n["id"] == edge["from_id"])
-            to_node = next(n for n in nodes if n["id"] == edge["to_id"])
-            if from_node["id"] not in node_name_map:
-                # print(edge)
+            if from_id not in node_name_map:
                 continue
-            from_name = node_name_map[from_node["id"]]
-            if to_node["id"] not in node_name_map:
-                # print(edge)
+            from_name = node_name_map[from_id]
+            if to_id not in node_name_map:
                 continue
-            to_name = node_name_map[to_node["id"]]
-            rel_type = edge["relation_type"].upper()
+            to_name = node_name_map[to_id]
             if rel_type == "CLOSE":
-                object_types = ["objectt", "sittable-objectt", "switchable-objectt", "container-objectt",
-                                "surface-objectt", "grabbable-objectt", "static-objectt"]
                 if from_name in character_objects:
                     init.append(f"(close {from_name} {to_name})")
-                elif obj_types.get(from_name) in object_types:
+                elif obj_types.get(from_name) in _OBJECT_TYPES:
                     init.append(f"(close-objects {from_name} {to_name})")
             elif rel_type == "FACING":
                 if from_name in character_objects:
@@ -458,40 +655,33 @@ Goal condition for '{obj}':
             from_name = node_name_map.get(node["id"])
             if from_name is None:
                 continue
-            from_type = infer_type(node)
-            if from_type in ["grabbable-objectt", "sittable-objectt", "switchable-objectt", "container-objectt"]:
-                # check if the object is already placed somewhere
+            from_type = types_by_id[node["id"]]
+            if from_type in _PLACEABLE_TYPES:
+                # one pass over its edges: is it placed on/in something, and which room is it in
                 placed = False
-                for edge in edges:
-                    if edge["from_id"] == node["id"]:
-                        rel_type = edge["relation_type"].upper()
-                        to_id = edge["to_id"]
-                        to_name = node_name_map.get(to_id)
-                        to_type = obj_types.get(to_name)
-                        if rel_type in ["ON", "INSIDE"] and to_type != "room":
-                            placed = True
-                            break
-                if not placed:
-                    # find the room it is in
-                    for edge in edges:
-                        if edge["from_id"] == node["id"]:
-                            to_node = next(n for n in nodes if n["id"] == edge["to_id"])
-                            to_name = node_name_map.get(to_node["id"], None)
-                            if to_name is None:
-                                continue
-                            to_type = infer_type(to_node)
-                            if edge["relation_type"].upper() == "INSIDE" and to_type == "room":
-                                init.append(f"(reachable-inside-room {from_name} {to_name})")
-                                break
+                room_name = None
+                for _, to_id, rel_type in out_edges.get(node["id"], []):
+                    to_name = node_name_map.get(to_id)
+                    if rel_type in _PLACEMENT_RELATIONS and obj_types.get(to_name) != "room":
+                        placed = True
+                        break
+                    # any INSIDE edge left here points at a room of the problem or at a skipped node
+                    if room_name is None and rel_type == "INSIDE" and to_name is not None:
+                        room_name = to_name
+                if not placed and room_name is not None:
+                    init.append(f"(reachable-inside-room {from_name} {room_name})")
 
         print(f"Creating PDDL Problem with {len(objects)} objects and {len(init)} initial conditions")
         # write to PDDL problem file
+        problem_name = f"vh_task_{task_id}_{task_title.replace(' ', '_')}"
+        objects_text = '\n'.join(objects)
+        init_text = '\n'.join(init)
         pddl_problem = f"""
-    (define (problem vh_task_{task['task_id']}_{task['title'].replace(" ", "_")})
+    (define (problem {problem_name})
         (:domain virtualhome)
         (:objects
             obj_agent_0 - agent
-            {'\n'.join(objects)}
+            {objects_text}
         )
         (:init
             (has-free-hand obj_agent_0)  ;; agent starts with free hand
@@ -499,7 +689,7 @@ Goal condition for '{obj}':
             (standing obj_agent_0)  ;; agent is standing at start
             (not(ready-to-move-to-next-obj obj_agent_0))  ;; agent is ready to move at start
             (not-ready-to-move-to-next-obj obj_agent_0)  ;; agent is not ready to move at start
-            {'\n'.join(init)}
+            {init_text}
         )
         (:goal
             ;; To be filled in using LLM based on task description
@@ -509,7 +699,7 @@ Goal condition for '{obj}':
         self.pddl_problem = pddl_problem
 
         # Generate goal using LLM
-        goal_pddl = self.generate_goal_pddl_using_llm(task['title'])
+        goal_pddl = self.generate_goal_pddl_using_llm(task_title)
         pddl_problem = pddl_problem.replace(
             ";; To be filled in using LLM based on task description",
             goal_pddl
@@ -519,12 +709,33 @@ Goal condition for '{obj}':
         print(f"✅ PDDL Problem created with {len(objects)} objects, {len(init)} init conditions")
 
         # Save the PDDL problem file
-        problem_filename = f"vh_task_{task['task_id']}_{task['title']}.pddl"
-        problem_file_path = PROJECT_PATH + r"core\pddl_system\tasks"
-        os.makedirs(problem_file_path, exist_ok=True)
-        full_problem_path = os.path.join(problem_file_path, problem_filename)
+        problem_filename = f"vh_task_{task_id}_{task_title}.pddl"
+        full_problem_path = os.path.join(self.PDDL_TASKS_DIR, problem_filename)
         with open(full_problem_path, 'w') as f:
             f.write(pddl_problem)
         print(f"✅ PDDL Problem saved to: {full_problem_path}")
+        self._problem_cache[problem_key] = pddl_problem
         return pddl_problem
 
+    def _problem_key(self, task, scene_graph):
+        """
+        Build the problem cache key for a task against a scene graph.
+
+        The domain is part of the key because the goal is generated against it
+        (and enrich_domain may have changed it).
+
+        Args:
+            task: Task dictionary
+            scene_graph: Scene graph dictionary with 'nodes' and 'edges'
+
+        Returns:
+            bytes: Digest identifying the conversion request
+        """
+        key_data = {
+            'task': [task['task_id'], task['title']],
+            'domain': self.virtualhome_domain_pddl,
+            'scene_graph': scene_graph,
+        }
+        payload = json.dumps(key_data, sort_keys=True, default=str).encode()
+        return hashlib.blake2b(payload, digest_size=16).digest()
+
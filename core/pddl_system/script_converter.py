@@ -9,6 +9,71 @@ It handles object name resolution, fuzzy matching, and action translation.
 import os
 import re
 
+# Class names that are rooms the planner refers to by name
+_ROOM_RE = re.compile(r'kitchen|bedroom|bathroom|living')
+
+# PDDL actions that become "[ACTION] <object> (id)" for one of their parameters:
+# action name -> (VirtualHome action, index of the object parameter)
+_SINGLE_OBJECT_ACTIONS = {
+    'walk-to-static-object': ('WALK', 1),            # (walk-to-static-object agent object)
+    'walk-to-surface-object': ('WALK', 2),           # (walk-to-surface-object agent object surface)
+    'walk-to-inside-container-object': ('WALK', 2),  # (walk-to-inside-container-object agent object container)
+    'walk-to-inside-room-object': ('WALK', 2),       # (walk-to-inside-room-object agent object room)
+    'sit': ('SIT', 1),                               # (sit agent furniture)
+    'open-container': ('OPEN', 1),                   # (open-container agent container)
+    'close-container': ('CLOSE', 1),                 # (close-container agent container)
+    'switchon': ('SWITCHON', 1),                     # (switchon agent appliance)
+    'switchoff': ('SWITCHOFF', 1),                   # (switchoff agent appliance)
+}
+
+# PDDL grab actions; the grabbed object is resolved with fuzzy matching
+_GRAB_ACTIONS = frozenset({'grab-from-surface', 'grab-from-container', 'grab-from-room'})
+
+# PDDL put actions -> VirtualHome action taking an object and a destination
+_PUT_ACTIONS = {
+    'put-on-surface': 'PUT',
+    'put-in-container': 'PUTIN',
+}
+
+# Semantic aliases and spelling variations for fuzzy object matching (Strategy 4)
+_ALIASES = {
+    # Electronics and appliances
+    'tv': ('television', 'tv_stand', 'tvstand'),
+    'computer': ('pc', 'desktop', 'laptop', 'cpuscreen'),
+    'fridge': ('refrigerator', 'icebox'),
+    'remote': ('remote_control', 'tv_remote', 'controller', 'remotecontrol'),
+    'phone': ('cellphone', 'cell_phone', 'telephone', 'smartphone'),
+    'coffeemaker': ('coffee_maker', 'coffe_maker', 'coffemachine', 'coffee_machine'),
+
+    # Furniture
+    'couch': ('sofa',),
+    'desk': ('table', 'worktable', 'work_table'),
+    'bookshelf': ('bookcase', 'book_shelf'),
+
+    # Containers and receptacles
+    'cup': ('mug', 'glass', 'drinkglass'),
+    'glass': ('cup', 'drinkglass', 'drinking_glass'),
+    'bowl': ('dish',),
+
+    # Reading materials
+    'book': ('novel', 'textbook', 'magazine'),
+
+    # Lights
+    'lamp': ('light', 'ceilinglamp', 'ceiling_lamp', 'floorlamp', 'floor_lamp'),
+    'light': ('lamp', 'ceilinglamp', 'ceiling_lamp'),
+
+    # Bathroom items
+    'sink': ('washbasin', 'basin'),
+    'toothbrush': ('tooth_brush',),
+
+    # Kitchen items
+    'stove': ('cooker', 'oven'),
+    'microwave': ('micro_wave',),
+
+    # Wearables
+    'glasses': ('eyeglasses', 'spectacles'),
+}
+
 
 class ScriptConverter:
     """
@@ -85,11 +150,9 @@ class ScriptConverter:
         script_filename = os.path.join(task_dir, "virtualhome_script.txt")
         print(f"Saving VirtualHome script to: {script_filename}")
         try:
+            script_lines = ''.join(f"{i+1}. {action}\n" for i, action in enumerate(vh_script))
             with open(script_filename, 'w') as f:
-                f.write(f"VIRTUALHOME SCRIPT:\n")
-                f.write("=" * 60 + "\n")
-                for i, action in enumerate(vh_script):
-                    f.write(f"{i+1}. {action}\n")
+                f.write(f"VIRTUALHOME SCRIPT:\n{'=' * 60}\n{script_lines}")
         except Exception as e:
             print(f"Warning: Could not save VirtualHome script file: {e}")
 
@@ -112,6 +175,8 @@ class ScriptConverter:
         mapping = {}
         # Track first instance of each object type
         first_of_type = {}
+        # Room mappings, built dynamically from the scene graph in the same pass
+        room_mapping = {}
 
         for node in graph['nodes']:
             # Use original case from VirtualHome
@@ -119,9 +184,9 @@ class ScriptConverter:
             base_name = original_name.lower().replace(' ', '_')
             node_id = node['id']
 
-            # Map base name to FIRST instance of that type (for consistency)
-            if base_name not in first_of_type:
-                first_of_type[base_name] = node_id
+            # Map base name to FIRST instance of that type (for consistency);
+            # node IDs are unique, so setdefault returns node_id only for the first one
+            if first_of_type.setdefault(base_name, node_id) == node_id:
                 mapping[base_name] = node_id
                 mapping[f"{base_name}_original"] = original_name
 
@@ -139,14 +204,8 @@ class ScriptConverter:
                 mapping['tv-remote_original'] = original_name
                 mapping['tv_remote_original'] = original_name
 
-        # Add room mappings dynamically from scene graph
-        room_mapping = {}
-        for node in graph['nodes']:
-            class_lower = node['class_name'].lower()
-            if any(room in class_lower for room in ['kitchen', 'bedroom', 'bathroom', 'living']):
-                room_name = class_lower.replace(' ', '_')
-                if room_name not in room_mapping:  # Use first instance
-                    room_mapping[room_name] = node['id']
+            if _ROOM_RE.search(base_name):
+                room_mapping.setdefault(base_name, node_id)  # Use first instance
 
         # Add known room mappings
         if 'kitchen' in room_mapping:
@@ -204,71 +263,27 @@ class ScriptConverter:
 
         # Strategy 4: Comprehensive semantic aliases and spelling variations
         # This handles common synonyms AND spelling variations (e.g., coffeemaker vs coffe_maker)
-        aliases = {
-            # Electronics and appliances
-            'tv': ['television', 'tv_stand', 'tvstand'],
-            'computer': ['pc', 'desktop', 'laptop', 'cpuscreen'],
-            'fridge': ['refrigerator', 'icebox'],
-            'remote': ['remote_control', 'tv_remote', 'controller', 'remotecontrol'],
-            'phone': ['cellphone', 'cell_phone', 'telephone', 'smartphone'],
-            'coffeemaker': ['coffee_maker', 'coffe_maker', 'coffemachine', 'coffee_machine'],
-
-            # Furniture
-            'couch': ['sofa'],
-            'desk': ['table', 'worktable', 'work_table'],
-            'bookshelf': ['bookcase', 'book_shelf'],
-
-            # Containers and receptacles
-            'cup': ['mug', 'glass', 'drinkglass'],
-            'glass': ['cup', 'drinkglass', 'drinking_glass'],
-            'bowl': ['dish'],
-
-            # Reading materials
-            'book': ['novel', 'textbook', 'magazine'],
-
-            # Lights
-            'lamp': ['light', 'ceilinglamp', 'ceiling_lamp', 'floorlamp', 'floor_lamp'],
-            'light': ['lamp', 'ceilinglamp', 'ceiling_lamp'],
-
-            # Bathroom items
-            'sink': ['washbasin', 'basin'],
-            'toothbrush': ['tooth_brush'],
-
-            # Kitchen items
-            'stove': ['cooker', 'oven'],
-            'microwave': ['micro_wave'],
-
-            # Wearables
-            'glasses': ['eyeglasses', 'spectacles'],
-        }
-
         # Check if target or any of its aliases match
-        for alias_base, synonyms in aliases.items():
+        for alias_base, synonyms in _ALIASES.items():
             # If target matches the base or any synonym
             if base_target == alias_base or base_target in synonyms:
                 # Try all variations of the base and synonyms
-                for synonym in [alias_base] + synonyms:
+                for synonym in (alias_base,) + synonyms:
                     if synonym in object_map:
                         print(f"  Semantic matched '{target_name}' to '{synonym}'")
                         return object_map[synonym], object_map.get(f"{synonym}_original", synonym)
 
-            # Also check reverse: if any key in object_map matches the alias group
-            for key in object_map.keys():
-                if '_original' not in key:
-                    # Check if the key matches the base or any synonym
-                    if key == alias_base or key in synonyms:
-                        if base_target == alias_base or base_target in synonyms:
-                            print(f"  Semantic matched '{target_name}' to '{key}' via aliases")
-                            return object_map[key], object_map.get(f"{key}_original", key)
+        # Object names without the "*_original" display-name entries, shared by
+        # the remaining strategies
+        object_keys = [key for key in object_map if '_original' not in key]
 
         # Strategy 5: Partial substring match (relaxed)
-        for key in object_map.keys():
-            if '_original' not in key:
-                # Match if target is substring of key or vice versa (minimum 4 chars)
-                if len(base_target) >= 4 and len(key) >= 4:
-                    if base_target in key or key in base_target:
-                        print(f"  Fuzzy matched '{target_name}' to '{key}'")
-                        return object_map[key], object_map.get(f"{key}_original", key)
+        # Match if target is substring of key or vice versa (minimum 4 chars)
+        if len(base_target) >= 4:
+            for key in object_keys:
+                if len(key) >= 4 and (base_target in key or key in base_target):
+                    print(f"  Fuzzy matched '{target_name}' to '{key}'")
+                    return object_map[key], object_map.get(f"{key}_original", key)
 
         # Strategy 6: Levenshtein distance for spelling errors
         # Only calculate for reasonable length matches to avoid performance issues
@@ -276,8 +291,8 @@ class ScriptConverter:
             best_match = None
             best_distance = float('inf')
 
-            for key in object_map.keys():
-                if '_original' not in key and len(key) >= 4:
+            for key in object_keys:
+                if len(key) >= 4:
                     # Calculate simple edit distance (Levenshtein)
                     distance = self._levenshtein_distance(base_target, key)
                     # Accept if distance is <= 2 (allows for 1-2 character typos)
@@ -291,7 +306,7 @@ class ScriptConverter:
 
         # Failure
         print(f"  ⚠️ Object '{target_name}' not found in scene")
-        available = [k for k in object_map.keys() if '_original' not in k][:20]
+        available = object_keys[:20]
         print(f"  Available objects: {available}")
         return None, None
 
@@ -329,62 +344,17 @@ class ScriptConverter:
         """
         Converts a PDDL action to a VirtualHome (VH) script action.
         """
-        if action_name == "walk-to-static-object":
-            # (walk-to-static-object agent object) -> [WALK] <object> (id)
-            if len(params) >= 2:
-                destination = params[1]
-                obj_id = object_map.get(destination, 1)
-                original_name = object_map.get(f"{destination}_original", destination)
-                return f"[WALK] <{original_name}> ({obj_id})"
-
-        elif action_name == "walk-to-surface-object":
-            # (walk-to-surface-object agent object surface) -> [WALK] <surface> (id)
-            if len(params) >= 3:
-                surface = params[2]
-                obj_id = object_map.get(surface, 1)
-                original_name = object_map.get(f"{surface}_original", surface)
-                return f"[WALK] <{original_name}> ({obj_id})"
-
-        elif action_name == "walk-to-inside-container-object":
-            # (walk-to-inside-container-object agent object container) -> [WALK] <container> (id)
-            if len(params) >= 3:
-                container = params[2]
-                obj_id = object_map.get(container, 1)
-                original_name = object_map.get(f"{container}_original", container)
-                return f"[WALK] <{original_name}> ({obj_id})"
-
-        elif action_name == "walk-to-inside-room-object":
-            # (walk-to-inside-room-object agent object room) -> [WALK] <room> (id)
-            if len(params) >= 3:
-                room = params[2]
-                obj_id = object_map.get(room, 1)
-                original_name = object_map.get(f"{room}_original", room)
-                return f"[WALK] <{original_name}> ({obj_id})"
-
-        elif action_name == "sit":
-            # (sit agent furniture) -> [SIT] <furniture> (id)
-            if len(params) >= 2:
-                furniture_name = params[1]
-                furniture_id = object_map.get(furniture_name, 1)
-                original_name = object_map.get(f"{furniture_name}_original", furniture_name)
-                return f"[SIT] <{original_name}> ({furniture_id})"
-
-        elif action_name == "standup":
-            # (standup agent) -> [STANDUP]
-            return "[STANDUP]"
-
-        elif action_name == "grab-from-surface":
-            # (grab-from-surface agent object surface) -> [GRAB] <object> (id)
-            if len(params) >= 3:
-                obj_name = params[1]
-                obj_id, original_name = self._fuzzy_object_match(obj_name, object_map)
-                if obj_id is None:
-                    obj_id = 1
-                    original_name = obj_name
-                return f"[GRAB] <{original_name}> ({obj_id})"
-
-        elif action_name == "grab-from-container":
-            # (grab-from-container agent object container) -> [GRAB] <object> (id)
+        single_object_action = _SINGLE_OBJECT_ACTIONS.get(action_name)
+        if single_object_action is not None:
+            vh_action, param_index = single_object_action
+            if len(params) > param_index:
+                target_name = params[param_index]
+                target_id = object_map.get(target_name, 1)
+                original_name = object_map.get(f"{target_name}_original", target_name)
+                return f"[{vh_action}] <{original_name}> ({target_id})"
+
+        elif action_name in _GRAB_ACTIONS:
+            # (grab-from-* agent object location) -> [GRAB] <object> (id)
             if len(params) >= 3:
                 obj_name = params[1]
                 obj_id, original_name = self._fuzzy_object_match(obj_name, object_map)
@@ -393,65 +363,18 @@ class ScriptConverter:
                     original_name = obj_name
                 return f"[GRAB] <{original_name}> ({obj_id})"
 
-        elif action_name == "grab-from-room":
-            # (grab-from-room agent object room) -> [GRAB] <object> (id)
+        elif action_name in _PUT_ACTIONS:
+            # (put-* agent object destination) -> [PUT|PUTIN] <object> (obj_id) <destination> (destination_id)
             if len(params) >= 3:
                 obj_name = params[1]
-                obj_id, original_name = self._fuzzy_object_match(obj_name, object_map)
-                if obj_id is None:
-                    obj_id = 1
-                    original_name = obj_name
-                return f"[GRAB] <{original_name}> ({obj_id})"
-
-        elif action_name == "put-on-surface":
-            # (put-on-surface agent object surface) -> [PUTON] <object> (obj_id) <surface> (surface_id)
-            if len(params) >= 3:
-                obj_name = params[1]
-                surface_name = params[2]
+                destination_name = params[2]
                 obj_id = object_map.get(obj_name, 1)
-                surface_id = object_map.get(surface_name, 1)
-                return f"[PUT] <{obj_name}> ({obj_id}) <{surface_name}> ({surface_id})"
+                destination_id = object_map.get(destination_name, 1)
+                return f"[{_PUT_ACTIONS[action_name]}] <{obj_name}> ({obj_id}) <{destination_name}> ({destination_id})"
 
-        elif action_name == "put-in-container":
-            # (put-in-container agent object container) -> [PUTIN] <object> (obj_id) <container> (container_id)
-            if len(params) >= 3:
-                obj_name = params[1]
-                container_name = params[2]
-                obj_id = object_map.get(obj_name, 1)
-                container_id = object_map.get(container_name, 1)
-                return f"[PUTIN] <{obj_name}> ({obj_id}) <{container_name}> ({container_id})"
-
-        elif action_name == "open-container":
-            # (open-container agent container) -> [OPEN] <container> (id)
-            if len(params) >= 2:
-                container_name = params[1]
-                container_id = object_map.get(container_name, 1)
-                original_name = object_map.get(f"{container_name}_original", container_name)
-                return f"[OPEN] <{original_name}> ({container_id})"
-
-        elif action_name == "close-container":
-            # (close-container agent container) -> [CLOSE] <container> (id)
-            if len(params) >= 2:
-                container_name = params[1]
-                container_id = object_map.get(container_name, 1)
-                original_name = object_map.get(f"{container_name}_original", container_name)
-                return f"[CLOSE] <{original_name}> ({container_id})"
-
-        elif action_name == "switchon":
-            # (switchon agent appliance) -> [SWITCHON] <appliance> (id)
-            if len(params) >= 2:
-                appliance_name = params[1]
-                appliance_id = object_map.get(appliance_name, 1)
-                original_name = object_map.get(f"{appliance_name}_original", appliance_name)
-                return f"[SWITCHON] <{original_name}> ({appliance_id})"
-
-        elif action_name == "switchoff":
-            # (switchoff agent appliance) -> [SWITCHOFF] <appliance> (id)
-            if len(params) >= 2:
-                appliance_name = params[1]
-                appliance_id = object_map.get(appliance_name, 1)
-                original_name = object_map.get(f"{appliance_name}_original", appliance_name)
-                return f"[SWITCHOFF] <{original_name}> ({appliance_id})"
+        elif action_name == "standup":
+            # (standup agent) -> [STANDUP]
+            return "[STANDUP]"
 
         return None
 
@@ -93,13 +93,13 @@ class PDDLVirtualHomeSystem:
                 self.llm_planner = LLMPlanner(
                     self.model,
                     self.pddl_generator.current_scene_objects,
-                    PDDLGenerator.virtualhome_domain_pddl
+                    PDDLGenerator.load_domain()
                 )
             else:
                 # Update scene objects for current task
                 self.llm_planner.scene_objects = self.pddl_generator.current_scene_objects
 
-            # pddl_solution = self.llm_planner.solve_pddl_with_llm(pddl_problem, task)
+            # pddl_solution = asyncio.run(self.llm_planner.solve_pddl_with_llm(pddl_problem, task))
 
             pddl_solution = run_unified_planner_string(pddl_domain, pddl_problem)
 
@@ -2,11 +2,18 @@
 
 import sys
 import os
+import re
 import json
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../virtualhome/virtualhome/simulation'))
 from unity_simulator import comm_unity
 
+# One alternation per category so each class name is scanned once per category
+ROOM_PATTERN = re.compile(r'kitchen|bedroom|bathroom|living|dining|office')
+FURNITURE_PATTERN = re.compile(r'chair|desk|table|bed|sofa')
+APPLIANCE_PATTERN = re.compile(r'computer|fridge|stove|microwave|tv|cpuscreen')
+SMALL_OBJECT_PATTERN = re.compile(r'keyboard|mouse|book|plate|cup|door')
+
 def diagnose_apartment_setup():
     """Diagnose and explain what objects are available in the apartment"""
     comm = comm_unity.UnityCommunication(
@@ -46,24 +53,24 @@ def diagnose_apartment_setup():
     print(f"\n🏠 APARTMENT OVERVIEW")
     print(f"Total objects in apartment: {len(graph['nodes'])}")
 
+    # Lowercase each class name once; both passes below reuse these tuples
+    scene_objects = [(node['class_name'].lower(), node['id'], node.get('states', []))
+                     for node in graph['nodes']]
+
     # Categorize objects for explanation
     rooms = []
     furniture = []
     appliances = []
     small_objects = []
 
-    for node in graph['nodes']:
-        obj_class = node['class_name'].lower()
-        obj_id = node['id']
-        states = node.get('states', [])
-
-        if any(room in obj_class for room in ['kitchen', 'bedroom', 'bathroom', 'living', 'dining', 'office']):
+    for obj_class, obj_id, states in scene_objects:
+        if ROOM_PATTERN.search(obj_class):
             rooms.append((obj_class, obj_id, states))
-        elif any(furn in obj_class for furn in ['chair', 'desk', 'table', 'bed', 'sofa']):
+        elif FURNITURE_PATTERN.search(obj_class):
             furniture.append((obj_class, obj_id, states))
-        elif any(app in obj_class for app in ['computer', 'fridge', 'stove', 'microwave', 'tv', 'cpuscreen']):
+        elif APPLIANCE_PATTERN.search(obj_class):
             appliances.append((obj_class, obj_id, states))
-        elif any(item in obj_class for item in ['keyboard', 'mouse', 'book', 'plate', 'cup', 'door']):
+        elif SMALL_OBJECT_PATTERN.search(obj_class):
             small_objects.append((obj_class, obj_id, states))
 
     print(f"\n🏠 ROOMS & AREAS ({len(rooms)}):")
@@ -93,10 +100,7 @@ def diagnose_apartment_setup():
     # Show object mapping like our working algorithm
     print(f"\n🎯 OBJECT MAPPING (for task execution):")
     object_type_map = {}
-    for node in graph['nodes']:
-        obj_class = node['class_name'].lower()
-        obj_id = node['id']
-
+    for obj_class, obj_id, _ in scene_objects:
         if 'chair' in obj_class and 'chair' not in object_type_map:
             object_type_map['chair'] = obj_id
         elif ('computer' in obj_class or 'cpuscreen' in obj_class) and 'computer' not in object_type_map: